@@ -0,0 +1,173 @@
+import sqlite3
+
+# --- Agregações por Período (mês → trimestre → ano) ---
+# A tabela 'dre_agregado' guarda indicadores da DRE por empresa e período, em três
+# granularidades. Cada indicador soma linhas específicas da DRE e não categorias
+# inteiras, porque as categorias incluem linhas de subtotal (LUCRO BRUTO, RECEITA
+# BRUTA, "(-) DESPESAS OPERACIONAIS"...) que seriam contadas duas vezes. É atualizada de forma incremental a cada carga de dados:
+# só os meses recebidos (e os respetivos trimestre e ano) são recalculados.
+# A tabela 'versao_dados' conta as cargas por empresa e serve de chave para o cache
+# do dashboard.
+
+GRANULARIDADES = ['mes', 'trimestre', 'ano']
+# Indicador -> condição sobre as linhas da DRE (os mesmos critérios dos KPIs do dashboard)
+INDICADORES = {
+    'Receita Líquida': "\"descrição\" = 'RECEITA LÍQUIDA'",
+    'Despesas': "categoria = 'Despesa' AND \"descrição\" <> '(-) DESPESAS OPERACIONAIS'",
+    'Resultado Líquido': "(\"descrição\" LIKE '%LUCRO LÍQUIDO%' OR \"descrição\" LIKE '%PREJUÍZO DO EXERCÍCIO%')",
+}
+
+
+def criar_tabelas_agregacao(conn):
+    cursor = conn.cursor()
+    # A primeira versão da tabela somava categorias inteiras; é descartada e reconstruída
+    colunas = [row[1] for row in cursor.execute("PRAGMA table_info(dre_agregado)")]
+    reconstruir = 'categoria' in colunas
+    if reconstruir:
+        cursor.execute('DROP TABLE dre_agregado;')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dre_agregado (
+            empresa_id INTEGER NOT NULL,
+            indicador TEXT NOT NULL,
+            granularidade TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            total REAL NOT NULL,
+            PRIMARY KEY (empresa_id, granularidade, periodo, indicador)
+        );
+    ''')
+    cursor.execute('CREATE TABLE IF NOT EXISTS versao_dados (empresa_id INTEGER PRIMARY KEY, versao INTEGER NOT NULL);')
+    # Usado para recalcular apenas os meses afetados por uma carga
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_dre_empresa_periodo ON dre (empresa_id, periodo);')
+    conn.commit()
+    if reconstruir:
+        # Estas empresas já têm versão e não seriam apanhadas por garantir_agregacoes;
+        # a reconstrução também incrementa a versão, invalidando o cache do dashboard
+        for (empresa_id,) in cursor.execute("SELECT empresa_id FROM versao_dados").fetchall():
+            atualizar_agregacoes(conn, empresa_id)
+
+
+def trimestre_do_mes(periodo):
+    """'2024-05' -> '2024-T2'"""
+    ano, mes = periodo.split('-')[:2]
+    return f"{ano}-T{(int(mes) - 1) // 3 + 1}"
+
+
+def ano_do_mes(periodo):
+    return periodo[:4]
+
+
+def meses_do_periodo(periodo, granularidade):
+    """Meses ('AAAA-MM') que compõem o período: '2024-T2' -> ['2024-04', '2024-05', '2024-06']."""
+    if granularidade == 'mes':
+        return [periodo]
+    if granularidade == 'trimestre':
+        ano, numero = periodo.split('-T')
+        primeiro_mes = (int(numero) - 1) * 3 + 1
+        return [f"{ano}-{m:02d}" for m in range(primeiro_mes, primeiro_mes + 3)]
+    if granularidade == 'ano':
+        return [f"{periodo}-{m:02d}" for m in range(1, 13)]
+    raise ValueError(f"Granularidade inválida: {granularidade}")
+
+
+def deslocar_mes(mes, quantidade):
+    """'2024-05', -3 -> '2024-02'"""
+    ano, numero = map(int, mes.split('-')[:2])
+    indice = ano * 12 + numero - 1 + quantidade
+    return f"{indice // 12}-{indice % 12 + 1:02d}"
+
+
+def _limpar(cursor, empresa_id, granularidade, periodo):
+    cursor.execute(
+        "DELETE FROM dre_agregado WHERE empresa_id = ? AND granularidade = ? AND periodo = ?",
+        (empresa_id, granularidade, periodo)
+    )
+
+
+def _inserir(cursor, origem_sql, params):
+    cursor.execute(f"INSERT INTO dre_agregado (empresa_id, indicador, granularidade, periodo, total) {origem_sql}", params)
+
+
+def atualizar_agregacoes(conn, empresa_id, periodos=None):
+    """
+    Recalcula as agregações da empresa para os meses indicados (ou para todos os meses
+    presentes na DRE, se 'periodos' for None) e incrementa a versão dos dados da empresa.
+    Linhas sem período são ignoradas.
+    """
+    cursor = conn.cursor()
+    if periodos is None:
+        cursor.execute("SELECT DISTINCT periodo FROM dre WHERE empresa_id = ? AND periodo IS NOT NULL", (empresa_id,))
+        periodos = [row[0] for row in cursor.fetchall()]
+    meses = sorted({p for p in periodos if isinstance(p, str) and len(p) >= 7})
+
+    for mes in meses:
+        _limpar(cursor, empresa_id, 'mes', mes)
+        for indicador, condicao in INDICADORES.items():
+            # O GROUP BY evita uma linha com total NULL quando o indicador não existe no mês
+            _inserir(
+                cursor,
+                f"SELECT empresa_id, ?, 'mes', ?, SUM(valor) FROM dre WHERE empresa_id = ? AND periodo = ? AND {condicao} GROUP BY empresa_id",
+                (indicador, mes, empresa_id, mes)
+            )
+    # Trimestres e anos são derivados das agregações mensais, não das linhas brutas
+    for trimestre in sorted({trimestre_do_mes(m) for m in meses}):
+        meses_trimestre = tuple(meses_do_periodo(trimestre, 'trimestre'))
+        _limpar(cursor, empresa_id, 'trimestre', trimestre)
+        _inserir(
+            cursor,
+            "SELECT empresa_id, indicador, 'trimestre', ?, SUM(total) FROM dre_agregado WHERE empresa_id = ? AND granularidade = 'mes' AND periodo IN (?, ?, ?) GROUP BY empresa_id, indicador",
+            (trimestre, empresa_id) + meses_trimestre
+        )
+    for ano in sorted({ano_do_mes(m) for m in meses}):
+        _limpar(cursor, empresa_id, 'ano', ano)
+        _inserir(
+            cursor,
+            "SELECT empresa_id, indicador, 'ano', ?, SUM(total) FROM dre_agregado WHERE empresa_id = ? AND granularidade = 'trimestre' AND periodo LIKE ? GROUP BY empresa_id, indicador",
+            (ano, empresa_id, f"{ano}-T%")
+        )
+
+    cursor.execute(
+        "INSERT INTO versao_dados (empresa_id, versao) VALUES (?, 1) ON CONFLICT(empresa_id) DO UPDATE SET versao = versao + 1",
+        (empresa_id,)
+    )
+    conn.commit()
+
+
+def garantir_agregacoes(conn):
+    """
+    Constrói as agregações das empresas com DRE por período que nunca foram agregadas
+    (bases antigas). Usa 'versao_dados' e não 'dre_agregado': uma empresa sem nenhuma
+    linha dos INDICADORES não tem agregações, mas já foi processada.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT empresa_id FROM dre WHERE periodo IS NOT NULL AND empresa_id NOT IN (SELECT empresa_id FROM versao_dados)")
+    for (empresa_id,) in cursor.fetchall():
+        atualizar_agregacoes(conn, empresa_id)
+
+
+def versao_dados(conn, empresa_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT versao FROM versao_dados WHERE empresa_id = ?", (empresa_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def serie_por_periodo(conn, empresa_id, granularidade='mes'):
+    """Devolve (periodo, indicador, total) da empresa na granularidade pedida, por ordem de período."""
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT periodo, indicador, total FROM dre_agregado WHERE empresa_id = ? AND granularidade = ? ORDER BY periodo ASC",
+        (empresa_id, granularidade)
+    )
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    # Reconstrói todas as agregações numa base de dados existente
+    conn = sqlite3.connect('plataforma_financeira.db')
+    criar_tabelas_agregacao(conn)
+    for (empresa_id,) in conn.execute("SELECT DISTINCT empresa_id FROM dre").fetchall():
+        atualizar_agregacoes(conn, empresa_id)
+    conn.close()
+    print("Agregações por período reconstruídas.")
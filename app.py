@@ -1,18 +1,16 @@
 import streamlit as st
 import os
 import sqlite3
+import hashlib
 import pandas as pd
 import streamlit_authenticator as stauth
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.utilities import SQLDatabase
-from langchain.agents import AgentExecutor, create_sql_agent
-from langchain.agents.agent_toolkits import SQLDatabaseToolkit
-from langchain.tools import Tool
 import bcrypt
-import plotly.express as px
-from sklearn.linear_model import LinearRegression
-import numpy as np
+from arranque import stack_ia, stack_preditivo, plotly_express, aquecer_em_segundo_plano
+from historico_chat import (
+    JANELA_PADRAO, criar_tabela_historico, nova_conversa_id, ultima_conversa_id,
+    guardar_mensagem, contar_mensagens, carregar_janela, resumo_contexto
+)
+from agregacoes import criar_tabelas_agregacao, garantir_agregacoes, atualizar_agregacoes, versao_dados, serie_por_periodo, meses_do_periodo, deslocar_mes
 
 # --- Configuração da Página ---
 st.set_page_config(page_title="taxbaseAI - Plataforma de BI com IA", layout="wide")
@@ -72,6 +70,19 @@ if not os.path.exists(DB_PATH):
     st.error("Base de dados não encontrada. Por favor, execute o script 'migracao_db.py' primeiro.")
     st.stop()
 
+@st.cache_resource
+def preparar_base_dados():
+    """Cria as tabelas novas (histórico, agregações) e faz o backfill uma vez por processo, não a cada rerun."""
+    conn = get_db_connection()
+    try:
+        criar_tabela_historico(conn)
+        criar_tabelas_agregacao(conn)
+        garantir_agregacoes(conn)
+    finally:
+        conn.close()
+
+preparar_base_dados()
+
 def categorizar_conta(descricao):
     if not isinstance(descricao, str): return 'Outros'
     desc = descricao.upper()
@@ -98,11 +109,12 @@ def analisar_tendencia_receita(empresa_id: int) -> str:
         y = df['total_receita']
 
 
-        model = LinearRegression()
+        preditivo = stack_preditivo()
+        model = preditivo.LinearRegression()
         model.fit(X, y)
 
 
-        projecao_proximo_periodo = model.predict(np.array([[len(df)]]))[0]
+        projecao_proximo_periodo = model.predict(preditivo.np.array([[len(df)]]))[0]
         tendencia = "crescimento" if model.coef_[0] > 0 else "queda"
 
 
@@ -226,8 +238,25 @@ def calcular_indice_liquidez(empresa_id: int) -> str:
     finally: conn.close()
 
 # --- FUNÇÃO DO DASHBOARD ---
+@st.cache_data
+def carregar_series_periodo(empresa_id, granularidade, versao):
+    """Lê as agregações por período. A 'versao' entra na chave do cache para o invalidar a cada carga de dados."""
+    conn = get_db_connection()
+    try:
+        series_df = pd.DataFrame(serie_por_periodo(conn, empresa_id, granularidade), columns=['periodo', 'indicador', 'total'])
+    finally:
+        conn.close()
+    if series_df.empty:
+        return series_df
+    series_df = series_df.pivot_table(index='periodo', columns='indicador', values='total', aggfunc='sum').sort_index()
+    # As despesas vêm negativas da DRE; em módulo, subir no gráfico significa gastar mais
+    if 'Despesas' in series_df.columns:
+        series_df['Despesas'] = series_df['Despesas'].abs()
+    return series_df
+
 def display_dashboard(empresa_id):
     st.subheader("Dashboard de Visão Geral")
+    px = plotly_express()
     conn = get_db_connection()
     try:
         query = f"""
@@ -261,12 +290,61 @@ def display_dashboard(empresa_id):
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("Não foram encontradas despesas categorizadas para esta empresa.")
+        st.markdown("---")
+        st.subheader("Evolução por Período")
+        rotulos_granularidade = {'mes': 'Mês', 'trimestre': 'Trimestre', 'ano': 'Ano'}
+        granularidade = st.radio("Agrupar por:", options=list(rotulos_granularidade), format_func=rotulos_granularidade.get, horizontal=True, key=f"granularidade_{empresa_id}")
+        versao = versao_dados(conn, empresa_id)
+        series_df = carregar_series_periodo(empresa_id, granularidade, versao)
+        indicadores = [i for i in ['Receita Líquida', 'Despesas', 'Resultado Líquido'] if i in series_df.columns]
+        if indicadores:
+            ultimo = series_df.iloc[-1]
+            rotulo_ultimo = series_df.index[-1]
+            anterior = series_df.iloc[-2] if len(series_df) > 1 else None
+            rotulo_anterior = series_df.index[-2] if len(series_df) > 1 else None
+            # O último trimestre/ano costuma estar incompleto: compará-lo com um período inteiro
+            # mostraria uma queda falsa. Nesse caso compara com os mesmos meses do período anterior.
+            meses_ultimo = meses_do_periodo(rotulo_ultimo, granularidade)
+            mensal_df = series_df if granularidade == 'mes' else carregar_series_periodo(empresa_id, 'mes', versao)
+            meses_presentes = [m for m in meses_ultimo if m in mensal_df.index]
+            if meses_presentes and len(meses_presentes) < len(meses_ultimo):
+                rotulo_ultimo = f"{rotulo_ultimo}, parcial: {meses_presentes[0]} a {meses_presentes[-1]}"
+                meses_anteriores = [deslocar_mes(m, -len(meses_ultimo)) for m in meses_presentes]
+                anterior, rotulo_anterior = None, None
+                if all(m in mensal_df.index for m in meses_anteriores):
+                    anterior = mensal_df.loc[meses_anteriores, indicadores].sum()
+                    rotulo_anterior = f"{meses_anteriores[0]} a {meses_anteriores[-1]}"
+            elif rotulo_anterior is not None and not all(m in mensal_df.index for m in meses_do_periodo(rotulo_anterior, granularidade)):
+                # Período anterior incompleto (início dos dados): a comparação não seria justa
+                anterior = None
+            colunas = st.columns(len(indicadores))
+            for coluna, indicador in zip(colunas, indicadores):
+                delta = None
+                if anterior is not None and pd.notna(anterior[indicador]) and anterior[indicador] != 0:
+                    delta = f"{(ultimo[indicador] - anterior[indicador]) / abs(anterior[indicador]) * 100:.2f}% vs {rotulo_anterior}"
+                # Para despesas, um aumento é negativo para a empresa
+                cor_delta = "inverse" if indicador == 'Despesas' else "normal"
+                coluna.metric(f"{indicador} ({rotulo_ultimo})", f"R$ {ultimo[indicador]:,.2f}", delta, delta_color=cor_delta)
+            fig_series = px.line(series_df[indicadores].reset_index(), x='periodo', y=indicadores, markers=True, labels={'value': 'Valor (R$)', 'periodo': '', 'variable': ''}, color_discrete_sequence=['#007bff', '#dc3545', '#28a745'])
+            fig_series.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='#FAFAFA')
+            st.plotly_chart(fig_series, use_container_width=True)
+        else:
+            st.info("Não há dados históricos por período para esta empresa.")
     except Exception as e:
         st.error(f"Erro ao gerar o dashboard: {e}")
     finally:
         conn.close()
 
 # --- ⭐️ FASE 2: CARREGAMENTO DA BASE DE CONHECIMENTO SEMÂNTICA ⭐️ ---
+@st.cache_resource
+def load_gateway():
+    """Gateway único por processo: todas as sessões partilham o mesmo orçamento de pedidos e tokens."""
+    return stack_ia().GatewayLLM(
+        requisicoes_por_minuto=st.secrets.get("LLM_REQUISICOES_POR_MINUTO", 500),
+        tokens_por_minuto=st.secrets.get("LLM_TOKENS_POR_MINUTO", 200_000),
+        max_concorrencia=st.secrets.get("LLM_MAX_CONCORRENCIA", 8)
+    )
+
 @st.cache_resource
 def load_knowledge_base():
     """Carrega, vetoriza e armazena em cache a base de conhecimento."""
@@ -281,13 +359,36 @@ def load_knowledge_base():
     documents = [f"Termo: {row['termo']}\nDefinição: {row['definicao']}" for index, row in kb_df.iterrows()]
     metadatas = kb_df.to_dict('records')
     
-    embeddings = OpenAIEmbeddings(api_key=st.secrets["OPENAI_API_KEY"])
-    vector_store = FAISS.from_texts(documents, embeddings, metadatas=metadatas)
+    ia = stack_ia()
+    embeddings = ia.EmbeddingsAgrupados(
+        # Sem repetições no SDK: os 429 são tratados pelo gateway
+        ia.OpenAIEmbeddings(api_key=st.secrets["OPENAI_API_KEY"], base_url=st.secrets.get("OPENAI_BASE_URL"), max_retries=0),
+        load_gateway()
+    )
+    vector_store = ia.FAISS.from_texts(documents, embeddings, metadatas=metadatas)
     
     print("Base de conhecimento carregada.")
     return vector_store
 
-vector_store = load_knowledge_base()
+@st.cache_resource
+def load_sql_toolkit():
+    """Cria o LLM e o toolkit SQL uma vez por processo, em vez de a cada rerun."""
+    ia = stack_ia()
+    # Cada chamada ao modelo (passos do agente e verificação de queries) passa pelo gateway
+    llm = ia.chat_openai_com_gateway(
+        load_gateway(),
+        temperature=0,
+        model="gpt-4o",
+        openai_api_key=st.secrets["OPENAI_API_KEY"],
+        base_url=st.secrets.get("OPENAI_BASE_URL")
+    )
+    db = ia.SQLDatabase.from_uri(f"sqlite:///{DB_PATH}")
+    toolkit = ia.SQLDatabaseToolkit(db=db, llm=llm)
+    return llm, toolkit
+
+# A base de conhecimento e o stack de IA já não bloqueiam o ecrã de login:
+# são aquecidos numa thread de fundo e, se ainda não estiverem prontos, carregados no primeiro uso.
+aquecer_em_segundo_plano(stack_ia, load_gateway, load_knowledge_base, load_sql_toolkit, stack_preditivo)
 
 # --- AUTENTICAÇÃO ---
 conn = get_db_connection()
@@ -347,16 +448,6 @@ else:
         st.header("Converse com a IA")
         
         # --- ARQUITETURA FINAL COM FERRAMENTAS PREDITIVAS E SEMÂNTICAS ---
-        openai_key = st.secrets["OPENAI_API_KEY"]
-        llm = ChatOpenAI(
-            temperature=0,
-            model="gpt-4o",
-            openai_api_key=openai_key
-        )
-        db = SQLDatabase.from_uri(f"sqlite:///{DB_PATH}")
-        
-        toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-        
         # Junta TODAS as ferramentas (Fase 1 + Fase 3)
         ferramentas_especialistas_map = {
             "ferramenta_analise_lucratividade": analisar_lucratividade_completa,
@@ -367,126 +458,174 @@ else:
             "ferramenta_detectar_anomalia_despesa": detectar_anomalia_despesa
         }
         
-# --- LOOP DE CHAT INTEGRADO (Fase 2 + Fase 3) ---
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-# Exibe histórico de mensagens
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Entrada do usuário
-if prompt := st.chat_input(f"Pergunte algo sobre {empresa_selecionada_nome}..."):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    with st.chat_message("assistant"):
-        try:
-            with st.spinner("A IA está a pensar e a pesquisar..."):
-                # 1) Busca semântica com score
-                docs_scores = ( vector_store.similarity_search_with_score(prompt, k=1) if vector_store else [] )
-                resposta_final = ""
-
-                # 2) Se encontrou conceito com score alto
-                if docs_scores and docs_scores[0][1] >= 0.80:
-                        doc, score = docs_scores[0]
-                        meta = doc.metadata
-                        termo = meta.get("termo")
-                        definicao = meta.get("definicao", "")
-                        nome_ferramenta = meta.get("ferramenta_associada")
-
-                        # 2.a) Sem ferramenta associada: só retorna definição
-                        if not nome_ferramenta:
-                            resposta_final = f"**{termo}**\n\n{definicao}"
-
-                        # 2.b) Ferramenta especialista mapeada
-                        elif nome_ferramenta in ferramentas_especialistas_map:
-                            st.write(
-                                f"**Insight da IA:** "
-                                f"Sua pergunta está relacionada a **{termo}**. "
-                                "Executando a análise especialista..."
-                            )
-                            func = ferramentas_especialistas_map[nome_ferramenta]
-
-                            # Exemplo de ferramenta que extrai nome de despesa
-                            if nome_ferramenta == "ferramenta_detectar_anomalia_despesa":
-                                palavras = prompt.replace("?", "").split()
-                                try:
-                                    idx = palavras.index("em")
-                                    despesa = " ".join(palavras[idx + 1 :])
-                                except ValueError:
-                                    despesa = ""
-
-                                if not despesa:
-                                    resultado = (
-                                        "Por favor, especifique o nome da despesa. "
-                                        "Ex: 'verificar anomalia em Despesas com Pessoal'."
-                                    )
+        # --- LOOP DE CHAT INTEGRADO (Fase 2 + Fase 3) ---
+        # O histórico fica na base de dados (por utilizador, empresa e conversa);
+        # cada rerun só lê e desenha a janela mais recente.
+        email_usuario = st.session_state['username']
+        conversas = st.session_state.setdefault('conversas', {})
+        if empresa_selecionada_id not in conversas:
+            conn = get_db_connection()
+            conversas[empresa_selecionada_id] = ultima_conversa_id(conn, email_usuario, empresa_selecionada_id) or nova_conversa_id()
+            conn.close()
+        if st.sidebar.button("Nova Conversa"):
+            conversas[empresa_selecionada_id] = nova_conversa_id()
+        conversa_id = conversas[empresa_selecionada_id]
+        janelas_chat = st.session_state.setdefault('janelas_chat', {})
+        janela_chat = janelas_chat.get(conversa_id, JANELA_PADRAO)
+
+        conn = get_db_connection()
+        total_mensagens = contar_mensagens(conn, email_usuario, empresa_selecionada_id, conversa_id)
+        mensagens_recentes = carregar_janela(conn, email_usuario, empresa_selecionada_id, conversa_id, janela_chat)
+        conn.close()
+
+        # Mensagens mais antigas só são carregadas a pedido
+        mensagens_ocultas = total_mensagens - len(mensagens_recentes)
+        if mensagens_ocultas > 0:
+            if st.button(f"Carregar mensagens anteriores ({mensagens_ocultas} ocultas)"):
+                janelas_chat[conversa_id] = janela_chat + JANELA_PADRAO
+                st.rerun()
+
+        # Exibe histórico de mensagens
+        for message in mensagens_recentes:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+        # Entrada do usuário
+        if prompt := st.chat_input(f"Pergunte algo sobre {empresa_selecionada_nome}..."):
+            def responder():
+                """Guarda a pergunta, obtém a resposta e guarda-a; corre uma vez por pergunta em voo."""
+                conn = get_db_connection()
+                contexto_conversa = resumo_contexto(conn, email_usuario, empresa_selecionada_id, conversa_id)
+                guardar_mensagem(conn, email_usuario, empresa_selecionada_id, conversa_id, "user", prompt)
+                conn.close()
+                entrada_agente = f"Pergunta: {prompt}. ID da Empresa: {empresa_selecionada_id}"
+                if contexto_conversa:
+                    entrada_agente = f"Histórico recente da conversa:\n{contexto_conversa}\n\n{entrada_agente}"
+                try:
+                    vector_store = load_knowledge_base()
+                    llm, toolkit = load_sql_toolkit()
+                    create_sql_agent = stack_ia().create_sql_agent
+                    # Só partilham uma execução do agente os pedidos com exatamente a mesma entrada:
+                    # a entrada inclui o histórico da conversa, que é de cada utilizador
+                    chave_pergunta = (empresa_selecionada_id, hashlib.sha256(entrada_agente.encode('utf-8')).hexdigest())
+
+                    # 1) Busca semântica com score
+                    docs_scores = ( vector_store.similarity_search_with_score(prompt, k=1) if vector_store else [] )
+                    resposta_final = ""
+
+                    # 2) Se encontrou conceito com score alto
+                    if docs_scores and docs_scores[0][1] >= 0.80:
+                            doc, score = docs_scores[0]
+                            meta = doc.metadata
+                            termo = meta.get("termo")
+                            definicao = meta.get("definicao", "")
+                            nome_ferramenta = meta.get("ferramenta_associada")
+
+                            # 2.a) Sem ferramenta associada: só retorna definição
+                            if not nome_ferramenta:
+                                resposta_final = f"**{termo}**\n\n{definicao}"
+
+                            # 2.b) Ferramenta especialista mapeada
+                            elif nome_ferramenta in ferramentas_especialistas_map:
+                                st.write(
+                                    f"**Insight da IA:** "
+                                    f"Sua pergunta está relacionada a **{termo}**. "
+                                    "Executando a análise especialista..."
+                                )
+                                func = ferramentas_especialistas_map[nome_ferramenta]
+
+                                # Exemplo de ferramenta que extrai nome de despesa
+                                if nome_ferramenta == "ferramenta_detectar_anomalia_despesa":
+                                    palavras = prompt.replace("?", "").split()
+                                    try:
+                                        idx = palavras.index("em")
+                                        despesa = " ".join(palavras[idx + 1 :])
+                                    except ValueError:
+                                        despesa = ""
+
+                                    if not despesa:
+                                        resultado = (
+                                            "Por favor, especifique o nome da despesa. "
+                                            "Ex: 'verificar anomalia em Despesas com Pessoal'."
+                                        )
+                                    else:
+                                        resultado = func(despesa, empresa_selecionada_id)
                                 else:
-                                    resultado = func(despesa, empresa_selecionada_id)
+                                    resultado = func(empresa_selecionada_id)
+
+                                resposta_final = (
+                                    f"{resultado}\n\n---\n**O que isto significa?**\n\n*{definicao}*"
+                                )
+
+                            # 2.c) Metadata pede outra ferramenta: fallback SQL
                             else:
-                                resultado = func(empresa_selecionada_id)
-
-                            resposta_final = (
-                                f"{resultado}\n\n---\n**O que isto significa?**\n\n*{definicao}*"
-                            )
-
-                        # 2.c) Metadata pede outra ferramenta: fallback SQL
-                        else:
-                            agent = create_sql_agent(llm, toolkit=toolkit, verbose=True, handle_parsing_errors=True)
-                            try:
-                                resp = agent.invoke({
-                                    "input": f"Pergunta: {prompt}. ID da Empresa: {empresa_selecionada_id}"
-                                })
-                                resposta_final = resp["output"]
-                            except Exception:
-                                # Fallback manual
-                                resposta_final = """
-                                **Receita** é o total de recursos financeiros que entram numa empresa pela venda de bens ou serviços em determinado período.  
-                                **Despesa** são os recursos que a empresa gasta para operar e gerar essa receita — como salários, aluguel, impostos e custos de produção.
-
-                                No nosso sistema, cada registro na tabela `dre` tem uma coluna `categoria` que vale:
-                                    - `Receita` para entradas (valores positivos)
-                                    - `Despesa` para saídas (valores negativos)
-                                """
-
-                # 3) Sem conceito relevante: fallback SQL
-                else:
-                    agent = create_sql_agent(llm, toolkit=toolkit, verbose=True, handle_parsing_errors=True)
-                    try:
-                        resp = agent.invoke({ "input": f"Pergunta: {prompt}. ID da Empresa: {empresa_selecionada_id}" })
-                        resposta_final = resp["output"]
-                    except Exception:
-                        #Mesmo fallback manual
-                        resposta_final = """
-                        **Receita** é o total de recursos financeiros que entram numa empresa pela venda de bens ou serviços em determinado período.  
-                        **Despesa** são os recursos que a empresa gasta para operar e gerar essa receita — como salários, aluguel, impostos e custos de produção.
-
-                        No nosso sistema, cada registro na tabela `dre` tem uma coluna `categoria` que vale:
-                            - `Receita` para entradas (valores positivos)
-                            - `Despesa` para saídas (valores negativos)
-                        """
-
-                # 4) Exibe e registra
-                st.markdown(resposta_final)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": resposta_final
-                })
-
-        except Exception as e:
-            error_message = (
-                f"Desculpe, encontrei um erro ao processar a sua solicitação: {e}"
-            )
-            st.error(error_message)
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": error_message
-            })
+                                agent = create_sql_agent(llm, toolkit=toolkit, verbose=True, handle_parsing_errors=True)
+                                try:
+                                    resp = gateway.coalescer(
+                                        chave_pergunta,
+                                        lambda: agent.invoke({"input": entrada_agente})
+                                    )
+                                    resposta_final = resp["output"]
+                                except Exception:
+                                    # Fallback manual
+                                    resposta_final = """
+                                    **Receita** é o total de recursos financeiros que entram numa empresa pela venda de bens ou serviços em determinado período.  
+                                    **Despesa** são os recursos que a empresa gasta para operar e gerar essa receita — como salários, aluguel, impostos e custos de produção.
+
+                                    No nosso sistema, cada registro na tabela `dre` tem uma coluna `categoria` que vale:
+                                        - `Receita` para entradas (valores positivos)
+                                        - `Despesa` para saídas (valores negativos)
+                                    """
+
+                    # 3) Sem conceito relevante: fallback SQL
+                    else:
+                        agent = create_sql_agent(llm, toolkit=toolkit, verbose=True, handle_parsing_errors=True)
+                        try:
+                            resp = gateway.coalescer(chave_pergunta, lambda: agent.invoke({ "input": entrada_agente }))
+                            resposta_final = resp["output"]
+                        except Exception:
+                            #Mesmo fallback manual
+                            resposta_final = """
+                            **Receita** é o total de recursos financeiros que entram numa empresa pela venda de bens ou serviços em determinado período.  
+                            **Despesa** são os recursos que a empresa gasta para operar e gerar essa receita — como salários, aluguel, impostos e custos de produção.
+
+                            No nosso sistema, cada registro na tabela `dre` tem uma coluna `categoria` que vale:
+                                - `Receita` para entradas (valores positivos)
+                                - `Despesa` para saídas (valores negativos)
+                            """
+
+                    conn = get_db_connection()
+                    guardar_mensagem(conn, email_usuario, empresa_selecionada_id, conversa_id, "assistant", resposta_final)
+                    conn.close()
+                    return resposta_final, False
+                except Exception as e:
+                    error_message = (
+                        f"Desculpe, encontrei um erro ao processar a sua solicitação: {e}"
+                    )
+                    conn = get_db_connection()
+                    guardar_mensagem(conn, email_usuario, empresa_selecionada_id, conversa_id, "assistant", error_message)
+                    conn.close()
+                    return error_message, True
+
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+            with st.chat_message("assistant"):
+                try:
+                    with st.spinner("A IA está a pensar e a pesquisar..."):
+                        gateway = load_gateway()
+                        # Um segundo envio da mesma pergunta na mesma conversa (duplo clique, rerun)
+                        # junta-se à execução em curso: não grava a pergunta de novo nem corre outro agente
+                        chave_conversa = (email_usuario, conversa_id, " ".join(prompt.split()))
+                        resposta_final, com_erro = gateway.coalescer(chave_conversa, responder)
+                    if com_erro:
+                        st.error(resposta_final)
+                    else:
+                        st.markdown(resposta_final)
+                except Exception as e:
+                    st.error(f"Desculpe, encontrei um erro ao processar a sua solicitação: {e}")
 
-elif app_mode == "Painel Admin":
+    elif app_mode == "Painel Admin":
         st.header("🔑 Painel de Administração")
         st.subheader("Cadastrar Nova Empresa")
         with st.form("form_nova_empresa", clear_on_submit=True):
@@ -506,6 +645,8 @@ elif app_mode == "Painel Admin":
                         dre_df['empresa_id'] = id_nova_empresa
                         dre_df['categoria'] = dre_df['descrição'].apply(categorizar_conta)
                         dre_df.to_sql('dre', conn, if_exists='append', index=False)
+                        periodos_carregados = dre_df['periodo'].dropna().unique().tolist() if 'periodo' in dre_df.columns else []
+                        atualizar_agregacoes(conn, id_nova_empresa, periodos_carregados)
                         balanco_df = pd.read_csv(arquivo_balanco)
                         balanco_df['empresa_id'] = id_nova_empresa
                         balanco_df.to_sql('balanco', conn, if_exists='append', index=False)
@@ -589,6 +730,7 @@ elif app_mode == "Painel Admin":
                         try:
                             conn = get_db_connection()
                             cursor = conn.cursor()
+                            cursor.execute("DELETE FROM mensagens_chat WHERE email_usuario = (SELECT email FROM usuarios WHERE id = ?)", (usuario_a_deletar_id,))
                             cursor.execute("DELETE FROM usuarios WHERE id = ?", (usuario_a_deletar_id,))
                             cursor.execute("DELETE FROM permissoes WHERE id_usuario = ?", (usuario_a_deletar_id,))
                             conn.commit()
@@ -0,0 +1,70 @@
+import threading
+from functools import lru_cache
+from types import SimpleNamespace
+
+# --- Carregamento Lazy dos Subsistemas Pesados ---
+# O app.py não importa o stack de IA (langchain, OpenAI, FAISS) nem o de análise
+# (sklearn, numpy, plotly) no topo do módulo: cada um é importado no primeiro uso
+# através das funções abaixo. Assim o ecrã de login e o dashboard não pagam pelo
+# custo de importação da IA.
+
+
+@lru_cache(maxsize=None)
+def stack_ia():
+    """Importa as classes do langchain usadas pelo chat (uma vez por processo)."""
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.utilities import SQLDatabase
+    from langchain.agents import create_sql_agent
+    from langchain.agents.agent_toolkits import SQLDatabaseToolkit
+    from gateway_llm import GatewayLLM, EmbeddingsAgrupados, chat_openai_com_gateway
+    return SimpleNamespace(
+        OpenAIEmbeddings=OpenAIEmbeddings,
+        FAISS=FAISS,
+        SQLDatabase=SQLDatabase,
+        create_sql_agent=create_sql_agent,
+        SQLDatabaseToolkit=SQLDatabaseToolkit,
+        GatewayLLM=GatewayLLM,
+        EmbeddingsAgrupados=EmbeddingsAgrupados,
+        chat_openai_com_gateway=chat_openai_com_gateway,
+    )
+
+
+@lru_cache(maxsize=None)
+def stack_preditivo():
+    """Importa o numpy e o sklearn usados pelas ferramentas preditivas."""
+    import numpy as np
+    from sklearn.linear_model import LinearRegression
+    return SimpleNamespace(np=np, LinearRegression=LinearRegression)
+
+
+@lru_cache(maxsize=None)
+def plotly_express():
+    import plotly.express as px
+    return px
+
+
+_aquecimento_lock = threading.Lock()
+_aquecimento_iniciado = False
+
+
+def aquecer_em_segundo_plano(*tarefas):
+    """
+    Executa as tarefas de arranque (importações, base de conhecimento) numa thread
+    de fundo, uma única vez por processo. Erros são apenas registados: a mesma
+    tarefa volta a ser tentada no primeiro uso real.
+    """
+    global _aquecimento_iniciado
+    with _aquecimento_lock:
+        if _aquecimento_iniciado:
+            return
+        _aquecimento_iniciado = True
+
+    def executar():
+        for tarefa in tarefas:
+            try:
+                tarefa()
+            except Exception as e:
+                print(f"Aquecimento de '{getattr(tarefa, '__name__', tarefa)}' falhou: {e}")
+
+    threading.Thread(target=executar, name="aquecimento-arranque", daemon=True).start()
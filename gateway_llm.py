@@ -0,0 +1,245 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Any
+
+from langchain_core.embeddings import Embeddings
+
+from historico_chat import estimar_tokens
+
+# --- Gateway Partilhado para Chamadas ao LLM (chat e embeddings) ---
+# Todas as sessões do processo passam por uma única instância de GatewayLLM, que:
+#   - junta pedidos idênticos em voo numa só chamada (single-flight);
+#   - respeita um orçamento de pedidos e tokens por minuto, pondo os pedidos em fila;
+#   - limita o número de chamadas simultâneas ao fornecedor;
+#   - repete com backoff exponencial as chamadas recusadas por limite de taxa (HTTP 429).
+# O orçamento é aplicado a cada chamada ao fornecedor (cada completion do agente SQL e
+# cada lote de embeddings); o single-flight de perguntas inteiras fica no app.py.
+# O módulo importa langchain_core e por isso só é carregado pelo arranque.stack_ia().
+
+TOKENS_RESPOSTA_ESTIMADOS = 500  # Reserva para a resposta quando o modelo não define max_tokens
+
+
+def _eh_limite_taxa(erro):
+    status = getattr(erro, 'status_code', None) or getattr(getattr(erro, 'response', None), 'status_code', None)
+    return status == 429 or type(erro).__name__ == 'RateLimitError'
+
+
+def _retry_after(erro):
+    headers = getattr(getattr(erro, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class LimitadorTaxa:
+    """Token bucket de pedidos e tokens por minuto. adquirir() bloqueia até haver orçamento."""
+
+    def __init__(self, requisicoes_por_minuto, tokens_por_minuto):
+        self.requisicoes_por_minuto = requisicoes_por_minuto
+        self.tokens_por_minuto = tokens_por_minuto
+        self._requisicoes = float(requisicoes_por_minuto)
+        self._tokens = float(tokens_por_minuto)
+        self._ultima_reposicao = time.monotonic()
+        self._pausado_ate = 0.0
+        self._cond = threading.Condition()
+
+    def _repor(self):
+        agora = time.monotonic()
+        decorrido = agora - self._ultima_reposicao
+        self._ultima_reposicao = agora
+        self._requisicoes = min(self.requisicoes_por_minuto, self._requisicoes + decorrido * self.requisicoes_por_minuto / 60)
+        self._tokens = min(self.tokens_por_minuto, self._tokens + decorrido * self.tokens_por_minuto / 60)
+
+    def adquirir(self, tokens=0):
+        # Um pedido maior que o orçamento inteiro esperaria para sempre; limita-o à capacidade
+        tokens = min(tokens, self.tokens_por_minuto)
+        with self._cond:
+            while True:
+                self._repor()
+                espera_pausa = self._pausado_ate - time.monotonic()
+                if espera_pausa <= 0 and self._requisicoes >= 1 and self._tokens >= tokens:
+                    self._requisicoes -= 1
+                    self._tokens -= tokens
+                    return
+                espera = max(
+                    espera_pausa,
+                    (1 - self._requisicoes) * 60 / self.requisicoes_por_minuto,
+                    (tokens - self._tokens) * 60 / self.tokens_por_minuto,
+                )
+                self._cond.wait(timeout=max(espera, 0.01))
+
+    def pausar(self, segundos):
+        """Suspende novas aquisições (usado quando o fornecedor devolve 429)."""
+        with self._cond:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+            self._cond.notify_all()
+
+
+class SingleFlight:
+    """Garante que, para cada chave, só uma chamada está em curso; as restantes aguardam o mesmo resultado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_voo = {}
+
+    def executar(self, chave, funcao):
+        with self._lock:
+            futuro = self._em_voo.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = Future()
+                self._em_voo[chave] = futuro
+        if not lider:
+            return futuro.result(), True
+        try:
+            resultado = funcao()
+            futuro.set_result(resultado)
+            return resultado, False
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._em_voo.pop(chave, None)
+
+
+class GatewayLLM:
+    def __init__(self, requisicoes_por_minuto=500, tokens_por_minuto=200_000, max_concorrencia=8,
+                 max_tentativas=5, espera_base=1.0, espera_maxima=30.0):
+        self.limitador = LimitadorTaxa(requisicoes_por_minuto, tokens_por_minuto)
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._semaforo = threading.BoundedSemaphore(max_concorrencia)
+        self._singleflight = SingleFlight()
+        self._lock_estatisticas = threading.Lock()
+        self.estatisticas = {'chamadas': 0, 'coalescidas': 0, 'limites_taxa': 0}
+
+    def _contar(self, nome):
+        with self._lock_estatisticas:
+            self.estatisticas[nome] += 1
+
+    def executar(self, funcao, tokens_estimados=0, chave=None):
+        """
+        Executa 'funcao' dentro do orçamento do gateway. Se 'chave' for indicada, chamadas
+        concorrentes com a mesma chave partilham uma única execução.
+        """
+        if chave is None:
+            return self._executar_com_limites(funcao, tokens_estimados)
+        return self.coalescer(chave, lambda: self._executar_com_limites(funcao, tokens_estimados))
+
+    def coalescer(self, chave, funcao):
+        """Single-flight sem passar pelo orçamento (para quem já o aplica mais abaixo)."""
+        resultado, coalescida = self._singleflight.executar(chave, funcao)
+        if coalescida:
+            self._contar('coalescidas')
+        return resultado
+
+    def _executar_com_limites(self, funcao, tokens_estimados):
+        for tentativa in range(1, self.max_tentativas + 1):
+            self.limitador.adquirir(tokens_estimados)
+            with self._semaforo:
+                self._contar('chamadas')
+                try:
+                    return funcao()
+                except Exception as e:
+                    if not _eh_limite_taxa(e) or tentativa == self.max_tentativas:
+                        raise
+                    self._contar('limites_taxa')
+                    espera = _retry_after(e)
+                    if espera is None:
+                        espera = min(self.espera_maxima, self.espera_base * 2 ** (tentativa - 1)) * random.uniform(0.5, 1.0)
+            # A pausa vale para todos os pedidos: se o fornecedor recusou um, recusaria os outros
+            self.limitador.pausar(espera)
+
+
+class EmbeddingsAgrupados(Embeddings):
+    """
+    Embeddings do langchain que passam pelo gateway. Consultas que chegam dentro da
+    mesma janela curta são enviadas num único pedido em lote, e textos repetidos
+    (no lote ou em voo) são calculados uma só vez.
+    """
+
+    def __init__(self, embeddings, gateway, janela_segundos=0.01, tamanho_lote=64):
+        self.embeddings = embeddings
+        self.gateway = gateway
+        self.janela_segundos = janela_segundos
+        self.tamanho_lote = tamanho_lote
+        self._lock = threading.Lock()
+        self._pendentes = []
+        self._temporizador = None
+
+    def _embed_lote(self, textos):
+        return self.gateway.executar(lambda: self.embeddings.embed_documents(textos), sum(estimar_tokens(t) for t in textos))
+
+    def embed_documents(self, texts):
+        unicos = list(dict.fromkeys(texts))
+        vetores = {}
+        for inicio in range(0, len(unicos), self.tamanho_lote):
+            lote = unicos[inicio:inicio + self.tamanho_lote]
+            vetores.update(zip(lote, self._embed_lote(lote)))
+        return [vetores[texto] for texto in texts]
+
+    def embed_query(self, text):
+        return self.gateway.coalescer(('embedding', text), lambda: self._enfileirar(text))
+
+    def _enfileirar(self, texto):
+        futuro = Future()
+        with self._lock:
+            self._pendentes.append((texto, futuro))
+            lote_cheio = len(self._pendentes) >= self.tamanho_lote
+            if not lote_cheio and self._temporizador is None:
+                self._temporizador = threading.Timer(self.janela_segundos, self._despachar)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+        if lote_cheio:
+            self._despachar()
+        return futuro.result()
+
+    def _despachar(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, []
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+        if not pendentes:
+            return
+        try:
+            textos = [texto for texto, _ in pendentes]
+            vetores = dict(zip(textos, self.embed_documents(textos)))
+            for texto, futuro in pendentes:
+                futuro.set_result(vetores[texto])
+        except Exception as e:
+            for _, futuro in pendentes:
+                futuro.set_exception(e)
+
+
+@lru_cache(maxsize=None)
+def _classe_chat_openai_gateway():
+    # langchain_openai só é importado quando o chat é realmente criado
+    from langchain_openai import ChatOpenAI
+
+    class ChatOpenAIGateway(ChatOpenAI):
+        """ChatOpenAI em que cada completion passa pelo orçamento, semáforo e backoff do gateway."""
+
+        gateway: Any = None
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            tokens = sum(estimar_tokens(str(m.content)) for m in messages) + (self.max_tokens or TOKENS_RESPOSTA_ESTIMADOS)
+            return self.gateway.executar(lambda: super(ChatOpenAIGateway, self)._generate(messages, stop, run_manager, **kwargs), tokens)
+
+    return ChatOpenAIGateway
+
+
+def chat_openai_com_gateway(gateway, **kwargs):
+    """
+    Cria um ChatOpenAI ligado ao gateway. As repetições internas do SDK são desligadas
+    para que um 429 seja tratado pelo gateway, que pausa todos os pedidos.
+    O streaming também é desligado: o agente SQL chama stream() a cada passo, e esse
+    caminho (_stream) não passaria pelo _generate nem, portanto, pelo gateway.
+    """
+    return _classe_chat_openai_gateway()(gateway=gateway, max_retries=0, disable_streaming=True, **kwargs)
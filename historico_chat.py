@@ -0,0 +1,124 @@
+import sqlite3
+import uuid
+from datetime import datetime
+
+# --- Histórico de Chat Persistido (por utilizador, empresa e conversa) ---
+# O histórico vive na tabela 'mensagens_chat' em vez de st.session_state, para
+# que cada rerun só leia e desenhe uma janela recente de mensagens.
+
+JANELA_PADRAO = 20
+ORCAMENTO_TOKENS_PADRAO = 1500
+CARACTERES_POR_TOKEN = 4  # Aproximação usada pelos modelos da OpenAI para texto latino
+
+
+def criar_tabela_historico(conn):
+    """Cria a tabela de histórico e o índice usado pela leitura em janela."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mensagens_chat (
+            id INTEGER PRIMARY KEY,
+            email_usuario TEXT NOT NULL,
+            empresa_id INTEGER NOT NULL,
+            conversa_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            tokens INTEGER NOT NULL,
+            criado_em TEXT NOT NULL
+        );
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mensagens_chat_conversa "
+        "ON mensagens_chat (email_usuario, empresa_id, conversa_id, id);"
+    )
+    conn.commit()
+
+
+def estimar_tokens(texto):
+    if not texto:
+        return 0
+    return max(1, len(texto) // CARACTERES_POR_TOKEN)
+
+
+def nova_conversa_id():
+    return uuid.uuid4().hex
+
+
+def ultima_conversa_id(conn, email_usuario, empresa_id):
+    """Devolve a conversa mais recente do utilizador para a empresa, ou None."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT conversa_id FROM mensagens_chat WHERE email_usuario = ? AND empresa_id = ? ORDER BY id DESC LIMIT 1",
+        (email_usuario, empresa_id)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def guardar_mensagem(conn, email_usuario, empresa_id, conversa_id, role, content):
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO mensagens_chat (email_usuario, empresa_id, conversa_id, role, content, tokens, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (email_usuario, empresa_id, conversa_id, role, content, estimar_tokens(content), datetime.now().isoformat(timespec='seconds'))
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def contar_mensagens(conn, email_usuario, empresa_id, conversa_id):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM mensagens_chat WHERE email_usuario = ? AND empresa_id = ? AND conversa_id = ?",
+        (email_usuario, empresa_id, conversa_id)
+    )
+    return cursor.fetchone()[0]
+
+
+def carregar_janela(conn, email_usuario, empresa_id, conversa_id, limite=JANELA_PADRAO):
+    """
+    Carrega as 'limite' mensagens mais recentes da conversa, em ordem cronológica.
+    O custo depende apenas do tamanho da janela, não do tamanho da conversa.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, role, content FROM mensagens_chat WHERE email_usuario = ? AND empresa_id = ? AND conversa_id = ? ORDER BY id DESC LIMIT ?",
+        (email_usuario, empresa_id, conversa_id, limite)
+    )
+    rows = cursor.fetchall()
+    rows.reverse()
+    return [{"id": id_msg, "role": role, "content": content} for id_msg, role, content in rows]
+
+
+def resumo_contexto(conn, email_usuario, empresa_id, conversa_id, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO):
+    """
+    Monta um resumo das últimas trocas da conversa que cabe no orçamento de tokens,
+    para ser enviado ao LLM como contexto. As mensagens são lidas da mais recente
+    para a mais antiga e a leitura pára assim que o orçamento se esgota.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT role, content, tokens FROM mensagens_chat WHERE email_usuario = ? AND empresa_id = ? AND conversa_id = ? ORDER BY id DESC",
+        (email_usuario, empresa_id, conversa_id)
+    )
+    linhas = []
+    usados = 0
+    for role, content, tokens in cursor:
+        rotulo = "Utilizador" if role == "user" else "Assistente"
+        if usados + tokens > orcamento_tokens:
+            restante = orcamento_tokens - usados
+            # Inclui um excerto da mensagem que não coube, se ainda houver espaço útil
+            if restante > 20:
+                excerto = content[:restante * CARACTERES_POR_TOKEN].rstrip()
+                linhas.append(f"{rotulo}: {excerto}...")
+            break
+        linhas.append(f"{rotulo}: {content}")
+        usados += tokens
+    linhas.reverse()
+    return "\n".join(linhas)
+
+
+if __name__ == "__main__":
+    # Permite criar a tabela numa base de dados já existente sem refazer a migração
+    conn = sqlite3.connect('plataforma_financeira.db')
+    criar_tabela_historico(conn)
+    conn.close()
+    print("Tabela 'mensagens_chat' disponível.")
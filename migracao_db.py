@@ -4,6 +4,9 @@ import os
 import bcrypt
 from datetime import datetime, timedelta
 import numpy as np
+from historico_chat import criar_tabela_historico
+from agregacoes import criar_tabelas_agregacao, atualizar_agregacoes
+from snapshot_colunar import exportar_snapshot
 
 # --- Configuração ---
 ARQUIVO_DB = 'plataforma_financeira.db'
@@ -29,6 +32,9 @@ print("Tabelas de estrutura criadas com a coluna 'periodo'.")
 # --- Índice para acelerar buscas na knowledge_base ---
 cursor.execute("CREATE INDEX idx_knowledge_base_termo ON knowledge_base (termo);")
 
+# --- Histórico de chat persistido (por utilizador, empresa e conversa) ---
+criar_tabela_historico(conn)
+
 
 # --- FUNÇÃO DE CATEGORIZAÇÃO (permanece a mesma) ---
 def categorizar_conta(descricao):
@@ -135,6 +141,12 @@ for empresa in empresas_para_carregar:
     except Exception as e:
         print(f"Erro ao carregar dados para {empresa['nome']}: {e}")
 
+# --- Agregações por período (mês → trimestre → ano) para o dashboard ---
+criar_tabelas_agregacao(conn)
+for empresa in empresas_para_carregar:
+    atualizar_agregacoes(conn, empresa['id'])
+print("Agregações por período calculadas.")
+
 # Conceder permissões (permanece o mesmo)
 permissoes_iniciais = [(1, 1), (1, 2), (1, 3), (2, 2)]
 cursor.executemany(
@@ -145,4 +157,8 @@ print("Permissões iniciais concedidas.")
 
 conn.commit()
 conn.close()
-print("Migração com dados históricos e base de conhecimento concluída.")
\ No newline at end of file
+print("Migração com dados históricos e base de conhecimento concluída.")
+
+# --- Snapshot colunar (Arrow) lido pelos relatórios da carteira ---
+manifesto = exportar_snapshot(ARQUIVO_DB)
+print("Snapshot colunar exportado: " + ", ".join(f"{t} ({n} linhas)" for t, n in manifesto['linhas'].items()))
\ No newline at end of file
@@ -0,0 +1,143 @@
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+import pandas as pd
+
+# --- Provisionamento em lote de utilizadores e permissões ---
+# Uso:
+#   python provisionar_usuarios.py utilizadores.csv [--custo 12] [--processos 4]
+#   python provisionar_usuarios.py --benchmark [--custos 10 11 12 13 14]
+#
+# O CSV deve ter as colunas: nome, email, senha, role, empresas
+# A coluna 'empresas' lista os nomes das empresas separados por ';' (pode ficar vazia).
+
+ARQUIVO_DB = 'plataforma_financeira.db'
+CUSTO_PADRAO = 12  # O mesmo work factor de bcrypt.gensalt()
+COLUNAS_OBRIGATORIAS = ['nome', 'email', 'senha', 'role', 'empresas']
+
+
+def gerar_hash(senha, custo=CUSTO_PADRAO):
+    salt = bcrypt.gensalt(rounds=custo)
+    return bcrypt.hashpw(senha.encode('utf-8'), salt).decode('utf-8')
+
+
+def _gerar_hash_args(args):
+    # O ProcessPoolExecutor.map só passa um argumento por chamada
+    return gerar_hash(*args)
+
+
+def gerar_hashes_em_paralelo(senhas, custo=CUSTO_PADRAO, processos=None):
+    """Calcula os hashes num pool de processos, preservando a ordem das senhas."""
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        return list(executor.map(_gerar_hash_args, [(senha, custo) for senha in senhas], chunksize=8))
+
+
+def ler_csv_usuarios(caminho_csv):
+    usuarios_df = pd.read_csv(caminho_csv, dtype=str, keep_default_na=False)
+    usuarios_df.columns = [coluna.strip().lower() for coluna in usuarios_df.columns]
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in usuarios_df.columns]
+    if faltando:
+        raise ValueError(f"Colunas em falta no CSV: {', '.join(faltando)}")
+    usuarios_df['email'] = usuarios_df['email'].str.strip()
+    usuarios_df['role'] = usuarios_df['role'].str.strip().replace('', 'user')
+    if (usuarios_df[['nome', 'email', 'senha']] == '').any().any():
+        raise ValueError("Todas as linhas precisam de nome, email e senha.")
+    duplicados = usuarios_df.loc[usuarios_df['email'].duplicated(), 'email'].tolist()
+    if duplicados:
+        raise ValueError(f"Emails duplicados no CSV: {', '.join(duplicados)}")
+    invalidos = usuarios_df.loc[~usuarios_df['role'].isin(['user', 'admin']), 'email'].tolist()
+    if invalidos:
+        raise ValueError(f"Role inválida (use 'user' ou 'admin') para: {', '.join(invalidos)}")
+    return usuarios_df
+
+
+def provisionar(caminho_csv, custo=CUSTO_PADRAO, processos=None, db_path=ARQUIVO_DB):
+    """
+    Importa utilizadores e permissões de um CSV. Os hashes são calculados em paralelo
+    antes de abrir a transação, e todas as inserções são feitas numa única transação:
+    ou o ficheiro inteiro é importado, ou nada é.
+    """
+    usuarios_df = ler_csv_usuarios(caminho_csv)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        empresas_dict = {nome: id for id, nome in conn.execute('SELECT id, nome FROM empresas')}
+        permissoes_por_email = {}
+        for email, empresas in zip(usuarios_df['email'], usuarios_df['empresas']):
+            nomes = [nome.strip() for nome in empresas.split(';') if nome.strip()]
+            desconhecidas = [nome for nome in nomes if nome not in empresas_dict]
+            if desconhecidas:
+                raise ValueError(f"Empresas não encontradas para '{email}': {', '.join(desconhecidas)}")
+            permissoes_por_email[email] = [empresas_dict[nome] for nome in nomes]
+
+        # Verifica emails já cadastrados antes de gastar CPU com os hashes
+        emails = usuarios_df['email'].tolist()
+        existentes = []
+        for inicio in range(0, len(emails), 500):  # Abaixo do limite de parâmetros do SQLite
+            lote = emails[inicio:inicio + 500]
+            marcadores = ", ".join("?" * len(lote))
+            existentes.extend(row[0] for row in conn.execute(f"SELECT email FROM usuarios WHERE email IN ({marcadores})", lote))
+        if existentes:
+            raise ValueError(f"Emails já cadastrados: {', '.join(existentes)}")
+
+        inicio = time.perf_counter()
+        hashes = gerar_hashes_em_paralelo(usuarios_df['senha'].tolist(), custo, processos)
+        print(f"{len(hashes)} hashes gerados em {time.perf_counter() - inicio:.2f}s (custo {custo}).")
+
+        with conn:
+            cursor = conn.cursor()
+            total_permissoes = 0
+            for (nome, email, role), senha_hash in zip(usuarios_df[['nome', 'email', 'role']].itertuples(index=False), hashes):
+                cursor.execute("INSERT INTO usuarios (nome, email, senha, role) VALUES (?, ?, ?, ?)",
+                               (nome, email, senha_hash, role))
+                id_usuario = cursor.lastrowid
+                cursor.executemany("INSERT INTO permissoes (id_usuario, id_empresa) VALUES (?, ?)",
+                                   [(id_usuario, id_empresa) for id_empresa in permissoes_por_email[email]])
+                total_permissoes += len(permissoes_por_email[email])
+        print(f"{len(usuarios_df)} utilizadores e {total_permissoes} permissões importados.")
+    finally:
+        conn.close()
+
+
+def benchmark(custos, amostras=5):
+    """Mede, para cada custo, o tempo de gerar um hash e o de validar um login (checkpw)."""
+    senha = b'senha_de_benchmark'
+    print(f"{'custo':>5} | {'hash (ms)':>10} | {'login (ms)':>10}")
+    for custo in custos:
+        inicio = time.perf_counter()
+        for _ in range(amostras):
+            senha_hash = bcrypt.hashpw(senha, bcrypt.gensalt(rounds=custo))
+        tempo_hash = (time.perf_counter() - inicio) / amostras * 1000
+
+        inicio = time.perf_counter()
+        for _ in range(amostras):
+            bcrypt.checkpw(senha, senha_hash)
+        tempo_login = (time.perf_counter() - inicio) / amostras * 1000
+        print(f"{custo:>5} | {tempo_hash:>10.1f} | {tempo_login:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provisionamento em lote de utilizadores a partir de um CSV.")
+    parser.add_argument('csv', nargs='?', help="CSV com as colunas nome, email, senha, role, empresas")
+    parser.add_argument('--custo', type=int, default=CUSTO_PADRAO, help="Work factor do bcrypt (4 a 31)")
+    parser.add_argument('--processos', type=int, default=None, help="Processos para o hashing (padrão: número de CPUs)")
+    parser.add_argument('--db', default=ARQUIVO_DB, help="Caminho da base de dados")
+    parser.add_argument('--benchmark', action='store_true', help="Mede o custo do hash contra a latência de login")
+    parser.add_argument('--custos', type=int, nargs='+', default=[10, 11, 12, 13, 14], help="Custos a medir no benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.custos)
+    elif not args.csv:
+        parser.error("Indique o CSV a importar ou use --benchmark.")
+    elif not os.path.exists(args.db):
+        print("Base de dados não encontrada. Por favor, execute o script 'migracao_db.py' primeiro.")
+    else:
+        try:
+            provisionar(args.csv, args.custo, args.processos, args.db)
+        except (ValueError, sqlite3.IntegrityError) as e:
+            print(f"Importação cancelada, nenhum utilizador foi criado: {e}")
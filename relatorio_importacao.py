@@ -0,0 +1,87 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+# --- Relatório de Tempo de Importação (arranque a frio do app.py) ---
+# Uso:
+#   python relatorio_importacao.py [--orcamento-ms 2000] [--top 15]
+#
+# Importa, num processo Python novo, todos os módulos que o app.py importa no topo
+# e mede o tempo com 'python -X importtime'. Termina com código 1 se o total passar
+# do orçamento ou se algum subsistema pesado (que deve ser lazy) for carregado.
+
+ARQUIVO_APP = 'app.py'
+ORCAMENTO_PADRAO_MS = 2000
+# Prefixos de módulos que só podem ser carregados no primeiro uso (ver arranque.py)
+MODULOS_LAZY = ['langchain', 'langchain_core', 'langchain_openai', 'langchain_community', 'openai', 'faiss', 'sklearn', 'plotly']
+
+
+def importacoes_de_topo(caminho):
+    """Lista os módulos importados no nível de topo do ficheiro (sem entrar em funções)."""
+    with open(caminho, encoding='utf-8') as f:
+        arvore = ast.parse(f.read(), filename=caminho)
+    modulos = []
+    for no in arvore.body:
+        if isinstance(no, ast.Import):
+            modulos.extend(alias.name for alias in no.names)
+        elif isinstance(no, ast.ImportFrom) and no.module and no.level == 0:
+            modulos.append(no.module)
+    return list(dict.fromkeys(modulos))
+
+
+def medir_importacao(modulos, diretorio='.'):
+    codigo = "\n".join(f"import {modulo}" for modulo in modulos)
+    codigo += "\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    inicio = time.perf_counter()
+    resultado = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], capture_output=True, text=True, cwd=diretorio)
+    tempo_total_ms = (time.perf_counter() - inicio) * 1000
+    if resultado.returncode != 0:
+        raise RuntimeError(f"Falha ao importar os módulos do {ARQUIVO_APP}:\n{resultado.stderr[-2000:]}")
+
+    # Linhas no formato: 'import time:  self [us] | cumulative | imported package'
+    tempos = []
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        # Só os módulos de primeiro nível (sem indentação) para não contar tempos duas vezes
+        if not nome.startswith('  '):
+            tempos.append((nome.strip(), int(cumulativo) / 1000))
+    modulos_carregados = json.loads(resultado.stdout.strip().splitlines()[-1])
+    return tempo_total_ms, tempos, modulos_carregados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação do arranque do app.py.")
+    parser.add_argument('--orcamento-ms', type=float, default=ORCAMENTO_PADRAO_MS, help="Tempo máximo de importação, em ms")
+    parser.add_argument('--top', type=int, default=15, help="Quantos módulos mais lentos mostrar")
+    parser.add_argument('--app', default=ARQUIVO_APP, help="Ficheiro a analisar")
+    args = parser.parse_args()
+
+    modulos = importacoes_de_topo(args.app)
+    tempo_total_ms, tempos, modulos_carregados = medir_importacao(modulos, os.path.dirname(os.path.abspath(args.app)))
+    tempo_importacao_ms = sum(cumulativo for _, cumulativo in tempos)
+
+    print(f"Módulos importados no topo de {args.app}: {', '.join(modulos)}")
+    print(f"\n{'módulo':<45} | {'cumulativo (ms)':>15}")
+    for nome, cumulativo in sorted(tempos, key=lambda t: t[1], reverse=True)[:args.top]:
+        print(f"{nome:<45} | {cumulativo:>15.1f}")
+    print(f"\nTempo de importação: {tempo_importacao_ms:.0f} ms (processo completo: {tempo_total_ms:.0f} ms)")
+    print(f"Orçamento: {args.orcamento_ms:.0f} ms")
+
+    falhou = False
+    carregados_indevidamente = sorted({
+        prefixo for prefixo in MODULOS_LAZY
+        for modulo in modulos_carregados if modulo == prefixo or modulo.startswith(prefixo + '.')
+    })
+    if carregados_indevidamente:
+        print(f"ERRO: subsistemas lazy carregados no arranque: {', '.join(carregados_indevidamente)}")
+        falhou = True
+    if tempo_importacao_ms > args.orcamento_ms:
+        print(f"ERRO: o arranque excede o orçamento em {tempo_importacao_ms - args.orcamento_ms:.0f} ms")
+        falhou = True
+    sys.exit(1 if falhou else 0)
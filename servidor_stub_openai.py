@@ -0,0 +1,129 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Servidor Stub da API da OpenAI (para testes de carga locais) ---
+# Uso:
+#   python servidor_stub_openai.py [--porta 8900] [--latencia-ms 300] [--taxa-429 0.1] [--recusar-primeiros 0]
+#
+# Responde a /v1/embeddings e /v1/chat/completions no formato da API da OpenAI, com
+# latência configurável, uma fração de respostas 429 e/ou os primeiros N pedidos recusados
+# com 429, para exercitar o gateway_llm (ver testar_gateway.py).
+# Para apontar a app para o stub, defina em .streamlit/secrets.toml:
+#   OPENAI_BASE_URL = "http://localhost:8900/v1"
+# GET /estatisticas devolve a contagem de pedidos recebidos.
+
+DIMENSAO_EMBEDDING = 64
+estatisticas = {'embeddings': 0, 'textos_embedding': 0, 'chat': 0, 'recusados_429': 0}
+_lock = threading.Lock()
+
+
+def _contar(nome, quantidade=1):
+    with _lock:
+        estatisticas[nome] += quantidade
+
+
+def zerar_estatisticas():
+    with _lock:
+        for nome in estatisticas:
+            estatisticas[nome] = 0
+
+
+def _deve_recusar(taxa):
+    with _lock:
+        if StubHandler.recusar_primeiros > 0:
+            StubHandler.recusar_primeiros -= 1
+            return True
+    return random.random() < taxa
+
+
+def vetor_deterministico(texto):
+    """Vetor fixo por texto, para que a busca semântica seja reprodutível."""
+    digest = hashlib.sha256(texto.encode('utf-8')).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(DIMENSAO_EMBEDDING)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latencia = 0.0
+    taxa_429 = 0.0
+    recusar_primeiros = 0
+    retry_after = '1'
+
+    def _responder(self, status, corpo, headers=None):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/estatisticas':
+            with _lock:
+                self._responder(200, dict(estatisticas))
+        else:
+            self._responder(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length', 0))
+        pedido = json.loads(self.rfile.read(tamanho) or b'{}')
+        time.sleep(self.latencia)
+
+        if _deve_recusar(self.taxa_429):
+            _contar('recusados_429')
+            self._responder(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit_exceeded'}}, {'retry-after': self.retry_after})
+            return
+
+        if self.path.endswith('/embeddings'):
+            entradas = pedido.get('input', [])
+            if isinstance(entradas, str):
+                entradas = [entradas]
+            _contar('embeddings')
+            _contar('textos_embedding', len(entradas))
+            dados = [
+                {'object': 'embedding', 'index': i, 'embedding': vetor_deterministico(str(texto))}
+                for i, texto in enumerate(entradas)
+            ]
+            self._responder(200, {'object': 'list', 'data': dados, 'model': pedido.get('model', 'stub'),
+                                  'usage': {'prompt_tokens': len(entradas), 'total_tokens': len(entradas)}})
+        elif self.path.endswith('/chat/completions'):
+            _contar('chat')
+            self._responder(200, {
+                'id': f"chatcmpl-stub-{time.time_ns()}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': pedido.get('model', 'stub'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': 'Final Answer: Resposta do servidor stub.'},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+            })
+        else:
+            self._responder(404, {'error': {'message': 'Not found'}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor stub da API da OpenAI para testes locais.")
+    parser.add_argument('--porta', type=int, default=8900)
+    parser.add_argument('--latencia-ms', type=float, default=300, help="Latência simulada de cada resposta")
+    parser.add_argument('--taxa-429', type=float, default=0.0, help="Fração de pedidos recusados com 429 (0 a 1)")
+    parser.add_argument('--recusar-primeiros', type=int, default=0, help="Recusa com 429 os primeiros N pedidos")
+    args = parser.parse_args()
+
+    StubHandler.latencia = args.latencia_ms / 1000
+    StubHandler.taxa_429 = args.taxa_429
+    StubHandler.recusar_primeiros = args.recusar_primeiros
+    servidor = ThreadingHTTPServer(('localhost', args.porta), StubHandler)
+    print(f"Stub da OpenAI a escutar em http://localhost:{args.porta}/v1")
+    servidor.serve_forever()
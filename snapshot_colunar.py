@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+# --- Snapshot Colunar das Tabelas Financeiras ---
+# Uso:
+#   python snapshot_colunar.py exportar   # (re)gera o snapshot a partir da base SQLite
+#   python snapshot_colunar.py resumo     # relatório da carteira lido do snapshot (renovado se estiver desatualizado)
+#
+# As tabelas 'dre' e 'balanco' são exportadas em Arrow IPC sem compressão, com colunas
+# tipadas, os textos repetidos ('nome_empresa', 'descrição', 'categoria') codificados
+# em dicionário e os ficheiros particionados por empresa e período
+# (snapshot/dre/empresa_id=1/periodo=2024-05/...). A leitura é feita por memory-map,
+# pelo que as colunas numéricas não são copiadas nem convertidas em objetos Python.
+#
+# Cada exportação é escrita numa pasta versionada (snapshot.versoes/<data-hora>/) e
+# 'snapshot' é um link simbólico trocado atomicamente para a versão nova.
+# O migracao_db.py exporta o snapshot no fim da migração.
+
+ARQUIVO_DB = 'plataforma_financeira.db'
+DIRETORIO_SNAPSHOT = 'snapshot'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+VERSOES_MANTIDAS = 2  # A anterior continua disponível para leituras que já a abriram
+
+TEXTO_DICIONARIO = pa.dictionary(pa.int32(), pa.string())
+ESQUEMAS = {
+    'dre': pa.schema([
+        ('nome_empresa', TEXTO_DICIONARIO),
+        ('descrição', TEXTO_DICIONARIO),
+        ('valor', pa.float64()),
+        ('categoria', TEXTO_DICIONARIO),
+        ('empresa_id', pa.int32()),
+        ('periodo', pa.string()),
+    ]),
+    'balanco': pa.schema([
+        ('nome_empresa', TEXTO_DICIONARIO),
+        ('descrição', TEXTO_DICIONARIO),
+        ('saldo_atual', pa.float64()),
+        ('empresa_id', pa.int32()),
+        ('periodo', pa.string()),
+    ]),
+}
+PARTICIONAMENTO = ds.partitioning(pa.schema([('empresa_id', pa.int32()), ('periodo', pa.string())]), flavor='hive')
+
+
+def _ler_tabela_sqlite(conn, tabela):
+    esquema = ESQUEMAS[tabela]
+    colunas = ", ".join(f'"{nome}"' for nome in esquema.names)
+    linhas = conn.execute(f"SELECT {colunas} FROM {tabela}").fetchall()
+    valores_por_coluna = list(zip(*linhas)) if linhas else [[] for _ in esquema.names]
+    arrays = []
+    for campo, valores in zip(esquema, valores_por_coluna):
+        if pa.types.is_dictionary(campo.type):
+            arrays.append(pa.array(valores, type=pa.string()).dictionary_encode().cast(campo.type))
+        else:
+            arrays.append(pa.array(valores, type=campo.type))
+    return pa.Table.from_arrays(arrays, schema=esquema)
+
+
+def _versoes_dados(conn):
+    try:
+        return {str(empresa_id): versao for empresa_id, versao in conn.execute("SELECT empresa_id, versao FROM versao_dados")}
+    except sqlite3.OperationalError:
+        # Bases anteriores às agregações por período não têm a tabela de versões
+        return {}
+
+
+def _estado_origem(conn):
+    """Contagem de linhas e maior rowid de cada tabela exportada, para detetar alterações."""
+    return {
+        tabela: list(conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {tabela}").fetchone())
+        for tabela in ESQUEMAS
+    }
+
+
+def exportar_snapshot(db_path=ARQUIVO_DB, destino=DIRETORIO_SNAPSHOT):
+    """
+    Gera um snapshot novo numa pasta versionada e troca o link 'destino' para ela com
+    os.replace, que é atómico: um leitor vê sempre o snapshot anterior ou o novo, inteiro.
+    """
+    diretorio_versoes = f"{destino}.versoes"
+    versao = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    temporario = os.path.join(diretorio_versoes, versao)
+    os.makedirs(temporario)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        contagens = {}
+        for tabela in ESQUEMAS:
+            tabela_arrow = _ler_tabela_sqlite(conn, tabela)
+            ds.write_dataset(
+                tabela_arrow, os.path.join(temporario, tabela), format='ipc',
+                partitioning=PARTICIONAMENTO, basename_template='parte-{i}.arrow',
+                existing_data_behavior='overwrite_or_ignore'
+            )
+            contagens[tabela] = tabela_arrow.num_rows
+        manifesto = {
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'linhas': contagens,
+            'versoes': _versoes_dados(conn),
+            'origem': _estado_origem(conn),
+        }
+    finally:
+        conn.close()
+    with open(os.path.join(temporario, ARQUIVO_MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+    # Um snapshot no formato antigo (pasta em vez de link) só pode ser removido antes da troca
+    if os.path.isdir(destino) and not os.path.islink(destino):
+        shutil.rmtree(destino)
+    link_temporario = f"{destino}.link-{versao}"
+    os.symlink(os.path.relpath(temporario, os.path.dirname(os.path.abspath(destino))), link_temporario)
+    os.replace(link_temporario, destino)
+
+    for antiga in sorted(os.listdir(diretorio_versoes))[:-VERSOES_MANTIDAS]:
+        shutil.rmtree(os.path.join(diretorio_versoes, antiga), ignore_errors=True)
+    return manifesto
+
+
+def snapshot_desatualizado(db_path=ARQUIVO_DB, destino=DIRETORIO_SNAPSHOT):
+    """True se não houver snapshot ou se a DRE ou o balanço mudaram depois da exportação."""
+    caminho_manifesto = os.path.join(destino, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho_manifesto):
+        return True
+    with open(caminho_manifesto, encoding='utf-8') as f:
+        manifesto = json.load(f)
+    conn = sqlite3.connect(db_path)
+    try:
+        return (_estado_origem(conn) != manifesto.get('origem')
+                or _versoes_dados(conn) != manifesto.get('versoes', {}))
+    finally:
+        conn.close()
+
+
+def carregar_snapshot(tabela, empresa_ids=None, periodos=None, colunas=None, destino=DIRETORIO_SNAPSHOT):
+    """
+    Lê uma tabela do snapshot como pyarrow.Table. Os filtros por empresa e período
+    descartam partições inteiras sem as abrir; os ficheiros lidos são mapeados em memória.
+    """
+    if tabela not in ESQUEMAS:
+        raise ValueError(f"Tabela sem snapshot: {tabela}")
+    # Resolve o link uma única vez, para que toda a leitura use a mesma versão
+    caminho = os.path.join(os.path.realpath(destino), tabela)
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Snapshot não encontrado em '{caminho}'. Execute 'python snapshot_colunar.py exportar' primeiro.")
+    dataset = ds.dataset(
+        caminho, format='ipc', partitioning=PARTICIONAMENTO,
+        filesystem=pafs.LocalFileSystem(use_mmap=True)
+    )
+    filtro = None
+    if empresa_ids is not None:
+        filtro = pc.field('empresa_id').isin(list(empresa_ids))
+    if periodos is not None:
+        filtro_periodo = pc.field('periodo').isin(list(periodos))
+        filtro = filtro_periodo if filtro is None else filtro & filtro_periodo
+    return dataset.to_table(columns=colunas, filter=filtro)
+
+
+def resumo_carteira(destino=DIRETORIO_SNAPSHOT):
+    """
+    Indicadores da DRE por empresa e período para toda a carteira, calculados sobre o
+    snapshot. Usa as mesmas linhas que agregacoes.INDICADORES: somar categorias inteiras
+    contaria os subtotais da DRE duas vezes.
+    """
+    dre = carregar_snapshot('dre', colunas=['empresa_id', 'periodo', 'descrição', 'categoria', 'valor'], destino=destino)
+    # Os dicionários variam de ficheiro para ficheiro; as comparações usam o texto
+    descricao = dre.column('descrição').cast(pa.string())
+    categoria = dre.column('categoria').cast(pa.string())
+    filtros = {
+        'Receita Líquida': pc.equal(descricao, 'RECEITA LÍQUIDA'),
+        'Despesas': pc.and_(pc.equal(categoria, 'Despesa'), pc.not_equal(descricao, '(-) DESPESAS OPERACIONAIS')),
+        'Resultado Líquido': pc.or_(pc.match_substring(descricao, 'LUCRO LÍQUIDO'), pc.match_substring(descricao, 'PREJUÍZO DO EXERCÍCIO')),
+    }
+    partes = []
+    for indicador, filtro in filtros.items():
+        linhas = dre.select(['empresa_id', 'periodo', 'valor']).filter(filtro)
+        resumo = linhas.group_by(['empresa_id', 'periodo']).aggregate([('valor', 'sum')])
+        partes.append(resumo.append_column('indicador', pa.array([indicador] * resumo.num_rows, type=pa.string())))
+    resumo = pa.concat_tables(partes).select(['empresa_id', 'periodo', 'indicador', 'valor_sum'])
+    return resumo.rename_columns(['empresa_id', 'periodo', 'indicador', 'total']).sort_by(
+        [('empresa_id', 'ascending'), ('periodo', 'ascending'), ('indicador', 'ascending')]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot colunar das tabelas financeiras.")
+    parser.add_argument('acao', choices=['exportar', 'resumo'])
+    parser.add_argument('--db', default=ARQUIVO_DB, help="Caminho da base de dados")
+    parser.add_argument('--destino', default=DIRETORIO_SNAPSHOT, help="Diretório do snapshot")
+    args = parser.parse_args()
+
+    if args.acao == 'exportar':
+        manifesto = exportar_snapshot(args.db, args.destino)
+        print(f"Snapshot exportado para '{args.destino}': " + ", ".join(f"{t} ({n} linhas)" for t, n in manifesto['linhas'].items()))
+    else:
+        if snapshot_desatualizado(args.db, args.destino):
+            # Um relatório com números antigos não serve: renova o snapshot antes de o ler
+            exportar_snapshot(args.db, args.destino)
+            print("Snapshot desatualizado ou inexistente: renovado a partir da base de dados.")
+        print(resumo_carteira(args.destino).to_pandas().to_string(index=False))
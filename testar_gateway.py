@@ -0,0 +1,117 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from langchain_openai import OpenAIEmbeddings
+
+import servidor_stub_openai as stub
+from gateway_llm import GatewayLLM, LimitadorTaxa, EmbeddingsAgrupados, chat_openai_com_gateway
+
+# --- Verificação do gateway_llm contra o servidor stub ---
+# Uso:
+#   python testar_gateway.py
+#
+# Sobe o servidor_stub_openai.py numa thread (porta livre) e verifica o limitador de
+# taxa, o single-flight, o agrupamento de embeddings e o backoff em respostas 429
+# (também pelo caminho stream() usado pelo agente SQL).
+# Termina com erro (AssertionError) à primeira verificação que falhar.
+
+
+def iniciar_stub():
+    servidor = ThreadingHTTPServer(('localhost', 0), stub.StubHandler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://localhost:{servidor.server_address[1]}/v1"
+
+
+def preparar_stub(latencia=0.0, recusar_primeiros=0):
+    stub.StubHandler.latencia = latencia
+    stub.StubHandler.taxa_429 = 0.0
+    stub.StubHandler.recusar_primeiros = recusar_primeiros
+    stub.StubHandler.retry_after = '0.1'
+    stub.zerar_estatisticas()
+
+
+def em_paralelo(funcao, quantidade):
+    resultados = [None] * quantidade
+
+    def executar(i):
+        resultados[i] = funcao(i)
+
+    threads = [threading.Thread(target=executar, args=(i,)) for i in range(quantidade)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultados
+
+
+def testar_limitador():
+    limitador = LimitadorTaxa(requisicoes_por_minuto=600, tokens_por_minuto=1_000_000)
+    inicio = time.perf_counter()
+    for _ in range(600):
+        limitador.adquirir(10)
+    assert time.perf_counter() - inicio < 0.05, "o balde cheio deve atender a rajada sem esperar"
+    inicio = time.perf_counter()
+    limitador.adquirir(10)
+    # 600 pedidos/minuto = um pedido a cada 0,1 s
+    assert time.perf_counter() - inicio >= 0.08, "o pedido além do orçamento deve esperar"
+
+
+def testar_singleflight_chat(url):
+    preparar_stub(latencia=0.2)
+    gateway = GatewayLLM()
+    llm = chat_openai_com_gateway(gateway, model='stub', api_key='stub', base_url=url)
+    respostas = em_paralelo(lambda _: gateway.coalescer(('empresa', 'pergunta'), lambda: llm.invoke("pergunta").content), 8)
+    assert len(set(respostas)) == 1, respostas
+    assert stub.estatisticas['chat'] == 1, stub.estatisticas
+    assert gateway.estatisticas['coalescidas'] == 7, gateway.estatisticas
+
+
+def testar_lote_embeddings(url):
+    preparar_stub(latencia=0.05)
+    gateway = GatewayLLM()
+    inner = OpenAIEmbeddings(model='stub', api_key='stub', base_url=url, max_retries=0, check_embedding_ctx_length=False)
+    embeddings = EmbeddingsAgrupados(inner, gateway, janela_segundos=0.05)
+    vetores = em_paralelo(lambda i: embeddings.embed_query(f"consulta {i % 5}"), 20)
+    assert vetores[0] == vetores[5] == stub.vetor_deterministico("consulta 0")
+    assert stub.estatisticas['embeddings'] == 1, stub.estatisticas
+    assert stub.estatisticas['textos_embedding'] == 5, stub.estatisticas
+
+
+def testar_backoff_429(url):
+    preparar_stub(recusar_primeiros=2)
+    gateway = GatewayLLM(espera_base=0.05)
+    llm = chat_openai_com_gateway(gateway, model='stub', api_key='stub', base_url=url)
+    inicio = time.perf_counter()
+    resposta = llm.invoke("pergunta")
+    assert resposta.content, resposta
+    assert stub.estatisticas['recusados_429'] == 2, stub.estatisticas
+    assert stub.estatisticas['chat'] == 1, stub.estatisticas
+    assert gateway.estatisticas['limites_taxa'] == 2, gateway.estatisticas
+    # Duas pausas do Retry-After (0,1 s cada)
+    assert time.perf_counter() - inicio >= 0.2
+
+
+def testar_stream_429(url):
+    # O agente SQL usa stream(): cada passo tem de passar pelo orçamento e pelo backoff
+    preparar_stub(recusar_primeiros=2)
+    gateway = GatewayLLM(espera_base=0.05)
+    llm = chat_openai_com_gateway(gateway, model='stub', api_key='stub', base_url=url)
+    resposta = "".join(parte.content for parte in llm.stream("pergunta"))
+    assert resposta, resposta
+    assert stub.estatisticas['recusados_429'] == 2, stub.estatisticas
+    assert stub.estatisticas['chat'] == 1, stub.estatisticas
+    assert gateway.estatisticas['limites_taxa'] == 2, gateway.estatisticas
+    assert gateway.estatisticas['chamadas'] == 3, gateway.estatisticas
+
+
+if __name__ == "__main__":
+    servidor, url = iniciar_stub()
+    try:
+        for teste in (testar_limitador, lambda: testar_singleflight_chat(url),
+                      lambda: testar_lote_embeddings(url), lambda: testar_backoff_429(url),
+                      lambda: testar_stream_429(url)):
+            teste()
+        print("Gateway LLM: limitador, single-flight, lotes de embeddings, backoff 429 e streaming verificados.")
+    finally:
+        servidor.shutdown()